@@ -0,0 +1,40 @@
+# app/config.py
+import os
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Optional
+
+from dotenv import load_dotenv
+
+
+@dataclass(frozen=True)
+class Env:
+    DB_USER: str
+    DB_PASSWORD: str
+    DB_HOST: str
+    DB_PORT: str
+    DB_NAME: str
+    GEMINI_KEY: Optional[str]
+    DEFAULT_MODEL: str
+    FRONTEND_URL: Optional[str]
+    DEBUG_STARTUP: bool
+
+
+@lru_cache(maxsize=1)
+def env() -> Env:
+    """
+    Load `.env` once and snapshot the settings every module needs.
+    Later calls return the same frozen object without touching the file or os.environ.
+    """
+    load_dotenv(override=False)
+    return Env(
+        DB_USER=os.getenv("DB_USER", "postgres"),
+        DB_PASSWORD=os.getenv("DB_PASSWORD", "root"),
+        DB_HOST=os.getenv("DB_HOST", "localhost"),
+        DB_PORT=os.getenv("DB_PORT", "5432"),
+        DB_NAME=os.getenv("DB_NAME", ""),
+        GEMINI_KEY=os.getenv("GEMINI_API_KEY") or os.getenv("GOOGLE_API_KEY"),
+        DEFAULT_MODEL=os.getenv("GEMINI_MODEL", "gemini-2.5-flash"),
+        FRONTEND_URL=os.getenv("FRONTEND_URL"),
+        DEBUG_STARTUP=bool(os.getenv("DEBUG_STARTUP")),
+    )
@@ -1,49 +1,47 @@
 # app/db.py
-import os
-from datetime import datetime
-from dotenv import load_dotenv
+import asyncio
+import logging
 
-# --- Load envs early
-print("[db] Loading environment variables...")
-load_dotenv()
+from app.config import env
 
-# --- Read DB parts
-DB_USER = os.getenv("DB_USER", "postgres")
-DB_PASSWORD = os.getenv("DB_PASSWORD", "root")
-DB_HOST = os.getenv("DB_HOST", "localhost")
-DB_PORT = os.getenv("DB_PORT", "5432")
-DB_NAME = os.getenv("DB_NAME", "")
+logger = logging.getLogger("qna-api.db")
+
+# --- Read DB parts (loaded once, see app.config.env)
+DB_USER = env().DB_USER
+DB_PASSWORD = env().DB_PASSWORD
+DB_HOST = env().DB_HOST
+DB_PORT = env().DB_PORT
+DB_NAME = env().DB_NAME
 
 # --- Build URLs
 ASYNC_URL = None   
-SYNC_URL  = None   
 
 if DB_NAME:
-    ASYNC_URL = f"postgresql+asyncpg://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
-    SYNC_URL  = f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+    ASYNC_URL = f"postgres://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
 
 def _mask_url(url: str) -> str:
+    # Split on "://" and the last "@" rather than urlsplit: unencoded "/", "?" or "#"
+    # in the password would end urlsplit's netloc early and leak the password.
     if not url:
         return ""
-    try:
-        prefix, rest = url.split("://", 1)
-        creds, tail  = rest.split("@", 1)
-        if ":" in creds:
-            user, _pwd = creds.split(":", 1)
-            creds_masked = f"{user}:********"
-        else:
-            creds_masked = creds
-        return f"{prefix}://{creds_masked}@{tail}"
-    except Exception:
+    prefix, sep, rest = url.partition("://")
+    creds, at, tail = rest.rpartition("@")
+    if not sep or not at or ":" not in creds:
         return url
+    user = creds.split(":", 1)[0]
+    return f"{prefix}://{user}:********@{tail}"
+
+_MASKED_ASYNC = _mask_url(ASYNC_URL) if ASYNC_URL else "(none)"
 
-print(f"[db] DB_NAME          = {DB_NAME or '(empty)'}")
-print(f"[db] ASYNC_URL (masked)= {_mask_url(ASYNC_URL) if ASYNC_URL else '(none)'}")
-print(f"[db] SYNC_URL  (masked)= {_mask_url(SYNC_URL)  if SYNC_URL  else '(none)'}")
+if env().DEBUG_STARTUP:
+    print(f"[db] DB_NAME          = {DB_NAME or '(empty)'}")
+    print(f"[db] ASYNC_URL (masked)= {_MASKED_ASYNC}")
 
 
-from sqlalchemy import MetaData, Table, Column, Integer, Text, TIMESTAMP, create_engine
-from databases import Database
+import asyncpg
+from sqlalchemy import MetaData, Table, Column, Integer, Text, TIMESTAMP, text
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.schema import CreateTable
 
 
 metadata = MetaData()
@@ -54,52 +52,146 @@ qa_table = Table(
     Column("id", Integer, primary_key=True, autoincrement=True),
     Column("question", Text, nullable=False),
     Column("answer", Text, nullable=False),
-    Column("created_at", TIMESTAMP, nullable=False, default=datetime.utcnow),
+    Column("created_at", TIMESTAMP(timezone=True), nullable=False, server_default=text("now()")),
 )
 
+# DDL compiled once from the table metadata; executed over asyncpg, no sync engine needed.
+_CREATE_TABLE_SQL = str(CreateTable(qa_table, if_not_exists=True).compile(dialect=postgresql.dialect()))
+
+# asyncpg's per-connection statement cache prepares this once per pooled connection.
+_INSERT_SQL = "INSERT INTO qa_history (question, answer, created_at) VALUES ($1, $2, now())"
+
+# --- Batched writes: save_qa enqueues, a background task flushes up to _FLUSH_MAX rows
+# per round-trip, waiting at most _FLUSH_WINDOW seconds for a batch to fill.
+_FLUSH_MAX = 128
+_FLUSH_WINDOW = 0.05
+_QUEUE_MAXSIZE = 10_000
+_STOP = object()
+
 
-database = Database(ASYNC_URL) if ASYNC_URL else None
+# --- asyncpg pool (created in connect(), reused across requests)
+pool = None
+_queue = None
+_flusher = None
 
-def init_db(create_tables: bool = True):
+# Errors caused by a row's own data; anything else (connection, interface) affects the whole batch.
+_ROW_ERRORS = (asyncpg.DataError, asyncpg.IntegrityConstraintViolationError)
+
+async def _write_batch(rows: list):
+    """
+    executemany is all-or-nothing, so when the batch fails on a row's data, retry
+    row by row and drop only the rows that fail again. Other errors propagate
+    and are logged once per batch by the flusher.
     """
-    Synchronously ensure tables exist using a **sync** engine (no +asyncpg).
-    This avoids the 'greenlet_spawn / await_only()' error.
+    async with pool.acquire() as conn:
+        try:
+            await conn.executemany(_INSERT_SQL, rows)
+            return
+        except _ROW_ERRORS as e:
+            if len(rows) == 1:
+                raise
+            logger.warning("Batch insert of %d row(s) failed (%s); retrying one at a time", len(rows), e)
+
+        lost = 0
+        for row in rows:
+            try:
+                await conn.execute(_INSERT_SQL, *row)
+            except _ROW_ERRORS as e:
+                lost += 1
+                logger.debug("Dropping qa_history row: %s", e)
+        if lost:
+            logger.warning("Lost %d of %d row(s) from the batch", lost, len(rows))
+
+async def _next_batch(queue: asyncio.Queue) -> list:
+    """Block for the first row, then collect more until the batch is full or the window closes."""
+    batch = [await queue.get()]
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + _FLUSH_WINDOW
+    while len(batch) < _FLUSH_MAX and batch[-1] is not _STOP:
+        timeout = deadline - loop.time()
+        if timeout <= 0:
+            break
+        try:
+            batch.append(await asyncio.wait_for(queue.get(), timeout))
+        except asyncio.TimeoutError:
+            break
+    return batch
+
+async def _flush_forever(queue: asyncio.Queue):
+    while True:
+        batch = await _next_batch(queue)
+        stop = batch[-1] is _STOP
+        rows = [row for row in batch if row is not _STOP]
+        if rows:
+            try:
+                await _write_batch(rows)
+                logger.debug("Inserted %d row(s)", len(rows))
+            except Exception as e:
+                logger.warning("Insert of %d row(s) failed: %s", len(rows), e)
+        if stop:
+            return
+
+async def connect():
     """
-    print("[db.init_db] Enter")
-    if not SYNC_URL:
-        print("[db.init_db] SYNC_URL missing (DB_NAME empty) -> skipping table creation")
+    Open the shared asyncpg pool. No-op if DB is not configured.
+    """
+    global pool, _queue, _flusher
+    if not ASYNC_URL:
+        logger.info("ASYNC_URL missing (DB_NAME empty) -> skipping pool")
+        return
+    if pool is None:
+        pool = await asyncpg.create_pool(
+            dsn=ASYNC_URL,
+            min_size=5,
+            max_size=20,
+            max_inactive_connection_lifetime=300,
+        )
+        logger.info("Pool created (min_size=5, max_size=20)")
+        _queue = asyncio.Queue(maxsize=_QUEUE_MAXSIZE)
+        _flusher = asyncio.create_task(_flush_forever(_queue))
+
+async def disconnect():
+    """
+    Flush rows still queued, then close the pool.
+    """
+    global pool, _queue, _flusher
+    if _flusher is not None:
+        await _queue.put(_STOP)
+        await _flusher
+        _queue = None
+        _flusher = None
+        logger.debug("Pending inserts flushed")
+    if pool is not None:
+        await pool.close()
+        pool = None
+        logger.debug("Pool closed")
+
+async def init_db(create_tables: bool = True):
+    """
+    Ensure tables exist with `CREATE TABLE IF NOT EXISTS` on a short-lived asyncpg connection.
+    """
+    if not ASYNC_URL:
+        logger.info("ASYNC_URL missing (DB_NAME empty) -> skipping table creation")
         return
-
-    print("[db.init_db] Creating sync engine for DDL...")
-
-    engine = create_engine(SYNC_URL, echo=False, future=True)
 
     if create_tables:
-        print("[db.init_db] Calling metadata.create_all(engine)...")
-        metadata.create_all(engine)
-        print("[db.init_db] Tables ensured (qa_history).")
+        conn = await asyncpg.connect(dsn=ASYNC_URL)
+        try:
+            await conn.execute(_CREATE_TABLE_SQL)
+        finally:
+            await conn.close()
+        logger.info("Tables ensured (qa_history).")
     else:
-        print("[db.init_db] create_tables=False -> skipped create_all")
-
-    print("[db.init_db] Exit")
+        logger.debug("create_tables=False -> skipped DDL")
 
 async def save_qa(question: str, answer: str):
     """
-    Async insert using `databases`. No-op if database is None.
+    Queue a row for the background flusher. No-op if the pool is not open.
+    Raises asyncio.QueueFull if the database has fallen too far behind.
     """
-    print("[db.save_qa] Enter")
-    if database is None:
-        print("[db.save_qa] 'database' is None -> skipping insert")
+    if _queue is None:
+        logger.debug("Pool not open -> skipping insert")
         return None
-
-    try:
-        query = qa_table.insert().values(question=question, answer=answer)
-        print("[db.save_qa] Executing insert...")
-        inserted_id = await database.execute(query)
-        print(f"[db.save_qa] Insert OK (id={inserted_id})")
-        return inserted_id
-    except Exception as e:
-        print(f"[db.save_qa] Insert FAILED: {e}")
-        raise
-    finally:
-        print("[db.save_qa] Exit")
+    # PostgreSQL text rejects NUL bytes; strip them so one row can't fail its batch.
+    _queue.put_nowait((question.replace("\x00", ""), answer.replace("\x00", "")))
+    return None
@@ -1,52 +1,85 @@
 # app/main.py
-import os
-import asyncio
 import logging
 import importlib
+from contextlib import asynccontextmanager
 from typing import Optional
 
 from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
-from pydantic import BaseModel
-from dotenv import load_dotenv
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, ConfigDict
 
-load_dotenv()
+from app.config import env
 
 logging.basicConfig(level=logging.INFO)
+logging.getLogger("uvicorn").setLevel(logging.INFO)
 logger = logging.getLogger("qna-api")
+DEBUG_STARTUP = env().DEBUG_STARTUP
 
 # Gemeni client
-from app.services.ai_client import ask_gemini_sync
+from app.services.ai_client import ask_gemini, ask_gemini_stream
 
 
-db = None
 save_qa = None
 init_db = None
+connect_db = None
+disconnect_db = None
 
-DB_NAME = os.getenv("DB_NAME", "")
-print(f"[main] DB_NAME={DB_NAME or '(empty)'}")
+DB_NAME = env().DB_NAME
+if DEBUG_STARTUP:
+    print(f"[main] DB_NAME={DB_NAME or '(empty)'}")
 
 if DB_NAME:
-    print("[main] Attempting to import app.db ...")
+    if DEBUG_STARTUP:
+        print("[main] Attempting to import app.db ...")
     try:
         db_module = importlib.import_module("app.db")
         init_db = getattr(db_module, "init_db", None)
         save_qa = getattr(db_module, "save_qa", None)
-        db = getattr(db_module, "database", None)
+        connect_db = getattr(db_module, "connect", None)
+        disconnect_db = getattr(db_module, "disconnect", None)
         logger.info("DB module loaded successfully.")
-        print("[main] app.db imported OK")
     except Exception as e:
         logger.warning("DB import failed — running without DB: %s", e)
-        print(f"[main] app.db import FAILED: {e}")
 else:
-    print("[main] DB not configured (DB_NAME empty). Running without DB.")
+    logger.info("DB not configured (DB_NAME empty). Running without DB.")
 
-app = FastAPI(title="Tiny Q&A API (Gemini)")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    logger.info("Starting Tiny Q&A API")
+
+    # 1) Ensure tables (async DDL)
+    if init_db:
+        try:
+            await init_db()
+            logger.debug("init_db() OK")
+        except Exception as e:
+            logger.warning("init_db() failed: %s", e)
+
+    # 2) Open asyncpg pool
+    if connect_db:
+        try:
+            await connect_db()
+            logger.info("Connected to DB.")
+        except Exception as e:
+            logger.warning("DB connection failed: %s", e)
+
+    yield
+
+    logger.info("Shutting down API")
+    if disconnect_db:
+        try:
+            await disconnect_db()
+            logger.info("DB disconnected.")
+        except Exception as e:
+            logger.warning("DB disconnect failed: %s", e)
+
+app = FastAPI(title="Tiny Q&A API (Gemini)", lifespan=lifespan)
 
 # CORS
 ALLOWED_ORIGINS = ["http://localhost:4200", "http://127.0.0.1:4200"]
-frontend_url = os.getenv("FRONTEND_URL")
+frontend_url = env().FRONTEND_URL
 if frontend_url:
     ALLOWED_ORIGINS.append(frontend_url)
 
@@ -58,85 +91,81 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+class StreamSafeGZipMiddleware(GZipMiddleware):
+    """GZip everything except /ask/stream, where buffering in the compressor would hold back tokens."""
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["path"] == "/ask/stream":
+            await self.app(scope, receive, send)
+            return
+        await super().__call__(scope, receive, send)
+
+app.add_middleware(StreamSafeGZipMiddleware, minimum_size=512, compresslevel=5)
+
 class AskRequest(BaseModel):
+    # Stripping and the non-empty check run in pydantic-core; blank questions get a 422.
+    model_config = ConfigDict(str_strip_whitespace=True, str_min_length=1, extra="forbid")
+
     question: str
 
 class AskResponse(BaseModel):
     answer: str
     source: Optional[str] = "gemini"
 
-@app.on_event("startup")
-async def startup_event():
-    print("[startup] Enter")
-    logger.info("Starting Tiny Q&A API")
-
-    # 1) Ensure tables (sync DDL)
-    if init_db:
-        try:
-            print("[startup] Calling init_db() ...")
-            init_db()
-            print("[startup] init_db() OK")
-        except Exception as e:
-            logger.warning("init_db() failed: %s", e)
-            print(f"[startup] init_db() FAILED: {e}")
-
-    # 2) Connect async database
-    if db:
-        try:
-            print("[startup] Connecting async database ...")
-            await db.connect()
-            logger.info("Connected to DB.")
-            print("[startup] DB connected")
-        except Exception as e:
-            logger.warning("DB connection failed: %s", e)
-            print(f"[startup] DB connect FAILED: {e}")
-
-    print("[startup] Exit")
-
-@app.on_event("shutdown")
-async def shutdown_event():
-    print("[shutdown] Enter")
-    logger.info("Shutting down API")
-    if db:
-        try:
-            print("[shutdown] Disconnecting DB ...")
-            await db.disconnect()
-            logger.info("DB disconnected.")
-            print("[shutdown] DB disconnected")
-        except Exception as e:
-            logger.warning("DB disconnect failed: %s", e)
-            print(f"[shutdown] DB disconnect FAILED: {e}")
-    print("[shutdown] Exit")
-
 @app.post("/ask", response_model=AskResponse)
 async def ask(request: AskRequest):
-    print("[/ask] Enter")
-    q = (request.question or "").strip()
-    if not q:
-        print("[/ask] Empty question -> 400")
-        raise HTTPException(status_code=400, detail="Question is required")
+    q = request.question
 
     try:
-        print("[/ask] Calling ask_gemini_sync via to_thread ...")
-        answer = await asyncio.to_thread(ask_gemini_sync, q)
-        print("[/ask] Gemini answer received")
+        answer = await ask_gemini(q)
     except Exception as e:
         logger.exception("Gemini call failed: %s", e)
-        print(f"[/ask] Gemini FAILED: {e}")
         raise HTTPException(status_code=502, detail="AI service error")
 
-    if save_qa and db:
+    if save_qa:
         try:
-            print("[/ask] Saving to DB ...")
-            inserted_id = await save_qa(q, answer)
-            print(f"[/ask] Saved to DB (id={inserted_id})")
+            await save_qa(q, answer)
         except Exception as e:
             logger.warning("Save to DB failed: %s", e)
-            print(f"[/ask] Save to DB FAILED: {e}")
 
-    print("[/ask] Exit")
     return AskResponse(answer=answer, source="gemini")
 
+@app.post("/ask/stream")
+async def ask_stream(request: AskRequest):
+    q = request.question
+
+    # Wait for the first chunk before committing to a 200, so early failures still map to 502.
+    chunks = ask_gemini_stream(q)
+    try:
+        first = await anext(chunks, "")
+    except Exception as e:
+        logger.exception("Gemini stream failed: %s", e)
+        raise HTTPException(status_code=502, detail="AI service error")
+    if not first:
+        logger.warning("Gemini stream produced no text")
+        raise HTTPException(status_code=502, detail="AI service error")
+
+    async def body():
+        parts = [first]
+        yield first
+        try:
+            async for chunk in chunks:
+                parts.append(chunk)
+                yield chunk
+        except Exception as e:
+            # Re-raise so the server aborts the chunked response; the client sees a
+            # protocol error instead of a truncated answer that looks complete.
+            logger.exception("Gemini stream interrupted: %s", e)
+            raise
+
+        if save_qa:
+            try:
+                await save_qa(q, "".join(parts).strip())
+            except Exception as e:
+                logger.warning("Save to DB failed: %s", e)
+
+    return StreamingResponse(body(), media_type="text/plain; charset=utf-8")
+
 @app.get("/health")
 async def health():
     return {"status": "ok"}
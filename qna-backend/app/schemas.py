@@ -1,6 +1,8 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict
 
 class AskRequest(BaseModel):
+    model_config = ConfigDict(str_strip_whitespace=True, str_min_length=1, extra="forbid")
+
     question: str
 
 class AskResponse(BaseModel):
@@ -1,45 +1,222 @@
 # app/services/ai_client.py
-import os
+import json
 import time
+import asyncio
 import inspect
-from dotenv import load_dotenv
+import logging
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from pathlib import Path
+from typing import AsyncIterator
 
-load_dotenv()
+from app.config import env
 
-GEMINI_KEY = os.getenv("GEMINI_API_KEY") or os.getenv("GOOGLE_API_KEY")
-DEFAULT_MODEL = os.getenv("GEMINI_MODEL", "gemini-2.5-flash")
+logger = logging.getLogger("qna-api.ai_client")
+
+GEMINI_KEY = env().GEMINI_KEY
+DEFAULT_MODEL = env().DEFAULT_MODEL
 if not GEMINI_KEY:
-    print("[ai_client] WARNING: GEMINI_API_KEY not set; AI calls will fail until set.")
+    logger.warning("GEMINI_API_KEY not set; AI calls will fail until set.")
 
+# --- SDK state, filled in by _get_client() on first use so importing this module stays cheap.
 _has_new_genai = False
 _has_old_genai = False
 _client = None
 _old_genai = None
+_sdk_ready = False
+_sdk_lock = threading.Lock()
 
+def _resolve_generate_fn():
+    """Find the new SDK's generate function once, when the client is created."""
+    models_obj = getattr(_client, "models", None)
+    if models_obj is not None:
+        for n in ["generate_content", "generate", "create", "call", "generate_text"]:
+            f = getattr(models_obj, n, None)
+            if callable(f):
+                return f, f"models.{n}"
 
-try:
-    from google import genai  # type: ignore
-    try:
-        _client = genai.Client(api_key=GEMINI_KEY) if GEMINI_KEY else genai.Client()
-    except Exception:
-        _client = genai.Client()
-    _has_new_genai = True
-    print("[ai_client] Detected new google-genai SDK (genai.Client).")
-except Exception:
-    _has_new_genai = False
+    for n in ["generate_text", "generate"]:
+        f = getattr(_client, n, None)
+        if callable(f):
+            return f, n
+
+    return None, None
+
+_GEN_FN, _GEN_FN_NAME = None, None
+
+# Native async surface of the new SDK (httpx-backed); None on SDKs without `client.aio`.
+_AIO_MODELS = None
 
-if not _has_new_genai:
+@lru_cache(maxsize=None)
+def _signature_info(func):
+    """(accepted parameter names, accepts **kwargs) for func, or None if it can't be introspected."""
     try:
-        import google.generativeai as genai  # type: ignore
-        genai.configure(api_key=GEMINI_KEY)
-        _old_genai = genai
-        _has_old_genai = True
-        print("[ai_client] Detected older google.generativeai SDK.")
+        params = inspect.signature(func).parameters
     except Exception:
-        _has_old_genai = False
+        return None
+    accepts_varkw = any(p.kind == inspect.Parameter.VAR_KEYWORD for p in params.values())
+    return frozenset(params), accepts_varkw
+
+# --- Prompt/payload templates, built once; only the question is filled in per call.
+_SYSTEM_PROMPT = "You are a concise helpful assistant."
+_SYS_MSG = {"role": "system", "content": _SYSTEM_PROMPT}
+
+def _messages(question: str) -> list:
+    return [_SYS_MSG, {"role": "user", "content": question}]
+
+_PAYLOAD_TEMPLATES = (
+    ("messages", _messages),
+    ("contents", lambda q: [q]),
+    ("input",    lambda q: q),
+    ("prompt",   lambda q: q),
+)
+_TOKEN_PARAM_NAMES = ("max_output_tokens", "max_tokens", "max_tokens_to_sample")
+_TEMP_PARAM_NAMES = ("temperature", "temp")
+
+def _accepted_templates(func) -> tuple:
+    """Drop payload shapes whose main key func's signature can't take."""
+    sig = _signature_info(func) if func is not None else None
+    if sig is None or sig[1]:
+        return _PAYLOAD_TEMPLATES
+    return tuple(t for t in _PAYLOAD_TEMPLATES if t[0] in sig[0]) or _PAYLOAD_TEMPLATES
+
+_GEN_TEMPLATES = _PAYLOAD_TEMPLATES
+
+def _payload_variants(question: str, model: str) -> dict:
+    return {key: {key: build(question), "model": model} for key, build in _GEN_TEMPLATES}
+
+# --- Per-process LRU of answers to repeated questions (near-deterministic temperatures only).
+_ANSWER_CACHE_SIZE = 512
+_ANSWER_CACHE_MAX_TEMPERATURE = 0.5
+_answer_cache = OrderedDict()
+_answer_cache_lock = threading.Lock()
+
+def _cached_answer(model: str, question: str, temperature: float):
+    if temperature > _ANSWER_CACHE_MAX_TEMPERATURE:
+        return None
+    key = (model, question.strip().lower())
+    with _answer_cache_lock:
+        answer = _answer_cache.get(key)
+        if answer is not None:
+            _answer_cache.move_to_end(key)
+    return answer
+
+def _remember_answer(model: str, question: str, temperature: float, answer: str):
+    if temperature > _ANSWER_CACHE_MAX_TEMPERATURE or not answer:
+        return
+    key = (model, question.strip().lower())
+    with _answer_cache_lock:
+        _answer_cache[key] = answer
+        _answer_cache.move_to_end(key)
+        if len(_answer_cache) > _ANSWER_CACHE_SIZE:
+            _answer_cache.popitem(last=False)
+
+# --- Winning call shape: the kwargs keys that last worked for _GEN_FN, persisted so
+# later calls (and cold starts) skip the variant search entirely.
+_SHAPE_CACHE_PATH = Path.home() / ".cache" / "qna" / "gemini_shape.json"
+_TEMPLATE_BUILDERS = dict(_PAYLOAD_TEMPLATES)
+
+def _load_winning_shape():
+    try:
+        data = json.loads(_SHAPE_CACHE_PATH.read_text())
+    except (OSError, ValueError):
+        return None
+    if not isinstance(data, dict) or data.get("func") != _GEN_FN_NAME:
+        return None
+    keys = tuple(data.get("keys") or ())
+    known = {"model", *_TEMPLATE_BUILDERS, *_TOKEN_PARAM_NAMES, *_TEMP_PARAM_NAMES}
+    if not keys or not all(k in known for k in keys):
+        return None
+    return keys
+
+def _save_winning_shape(keys: tuple):
+    global _WINNING_SHAPE
+    if keys == _WINNING_SHAPE:
+        return
+    _WINNING_SHAPE = keys
+    try:
+        _SHAPE_CACHE_PATH.parent.mkdir(parents=True, exist_ok=True)
+        _SHAPE_CACHE_PATH.write_text(json.dumps({"func": _GEN_FN_NAME, "keys": list(keys)}))
+    except OSError as e:
+        logger.debug("Could not persist call shape: %s", e)
+
+def _forget_winning_shape():
+    global _WINNING_SHAPE
+    _WINNING_SHAPE = None
+    try:
+        _SHAPE_CACHE_PATH.unlink()
+    except OSError:
+        pass
+
+def _shape_kwargs(keys: tuple, question: str, model: str, max_output_tokens: int, temperature: float) -> dict:
+    kwargs = {}
+    for k in keys:
+        if k == "model":
+            kwargs[k] = model
+        elif k in _TOKEN_PARAM_NAMES:
+            kwargs[k] = max_output_tokens
+        elif k in _TEMP_PARAM_NAMES:
+            kwargs[k] = temperature
+        else:
+            kwargs[k] = _TEMPLATE_BUILDERS[k](question)
+    return kwargs
+
+_WINNING_SHAPE = None
+
+def _get_client():
+    """
+    Import and configure the GenAI SDK on first call (thread-safe), then resolve the
+    generate function, its payload shapes and any persisted call shape.
+    Returns the new-SDK client, or None when running on the older SDK.
+    """
+    global _has_new_genai, _has_old_genai, _client, _old_genai, _sdk_ready
+    global _GEN_FN, _GEN_FN_NAME, _AIO_MODELS, _GEN_TEMPLATES, _WINNING_SHAPE
+    if _sdk_ready:
+        return _client
+
+    with _sdk_lock:
+        if _sdk_ready:
+            return _client
 
-if not _has_new_genai and not _has_old_genai:
-    raise ImportError("No Google GenAI SDK found. Install `google-genai` or `google-generativeai`.")
+        try:
+            from google import genai  # type: ignore
+            try:
+                _client = genai.Client(api_key=GEMINI_KEY) if GEMINI_KEY else genai.Client()
+            except Exception:
+                _client = genai.Client()
+            _has_new_genai = True
+            logger.info("Detected new google-genai SDK (genai.Client).")
+        except Exception:
+            _has_new_genai = False
+
+        if not _has_new_genai:
+            try:
+                import google.generativeai as genai  # type: ignore
+                genai.configure(api_key=GEMINI_KEY)
+                _old_genai = genai
+                _has_old_genai = True
+                logger.info("Detected older google.generativeai SDK.")
+            except Exception:
+                _has_old_genai = False
+
+        if not _has_new_genai and not _has_old_genai:
+            raise ImportError("No Google GenAI SDK found. Install `google-genai` or `google-generativeai`.")
+
+        if _has_new_genai:
+            _GEN_FN, _GEN_FN_NAME = _resolve_generate_fn()
+            _AIO_MODELS = getattr(getattr(_client, "aio", None), "models", None)
+            _GEN_TEMPLATES = _accepted_templates(_GEN_FN)
+            _WINNING_SHAPE = _load_winning_shape() if _GEN_FN is not None else None
+
+        _sdk_ready = True
+    return _client
+
+async def _get_client_async():
+    """_get_client() for the async paths: the first-use SDK import runs in a worker thread, not on the event loop."""
+    if _sdk_ready:
+        return _client
+    return await asyncio.to_thread(_get_client)
 
 def _extract_text(resp) -> str:
     try:
@@ -79,22 +256,15 @@ def _extract_text(resp) -> str:
 
 def _call_with_signature(func, payload_variants: dict):
 
-    sig = None
-    try:
-        sig = inspect.signature(func)
-    except Exception:
-        sig = None
+    sig = _signature_info(func)
 
     tried = []
     for name, kwargs in payload_variants.items():
 
         if sig:
-            accepted = []
-            for k in kwargs.keys():
-                if k in sig.parameters:
-                    accepted.append(k)
+            params, accepts_varkw = sig
+            accepted = [k for k in kwargs.keys() if k in params]
 
-            accepts_varkw = any(p.kind == inspect.Parameter.VAR_KEYWORD for p in sig.parameters.values())
             if not accepted and not accepts_varkw:
 
                 tried.append((name, "skipped - signature doesn't accept keys"))
@@ -103,7 +273,7 @@ def _call_with_signature(func, payload_variants: dict):
             if accepts_varkw:
                 call_kwargs = kwargs
             else:
-                call_kwargs = {k: v for k, v in kwargs.items() if k in sig.parameters}
+                call_kwargs = {k: v for k, v in kwargs.items() if k in params}
         else:
 
             call_kwargs = kwargs
@@ -111,7 +281,7 @@ def _call_with_signature(func, payload_variants: dict):
         tried.append((name, f"trying with keys={list(call_kwargs.keys())}"))
         try:
             resp = func(**call_kwargs)
-            return resp, tried
+            return resp, tried, tuple(call_kwargs)
         except TypeError as te:
             tried.append((name, f"TypeError: {te}"))
 
@@ -127,10 +297,24 @@ def ask_gemini_sync(question: str,
                     temperature: float = 0.2,
                     retries: int = 2,
                     backoff: float = 1.0) -> str:
- 
+
     if not question or not question.strip():
         return ""
 
+    answer = _cached_answer(model, question, temperature)
+    if answer is None:
+        answer = _ask_gemini_sync_uncached(question, model, max_output_tokens, temperature, retries, backoff)
+        _remember_answer(model, question, temperature, answer)
+    return answer
+
+def _ask_gemini_sync_uncached(question: str,
+                              model: str,
+                              max_output_tokens: int,
+                              temperature: float,
+                              retries: int,
+                              backoff: float) -> str:
+
+    _get_client()
     last_err = None
     for attempt in range(retries + 1):
         try:
@@ -139,97 +323,68 @@ def ask_gemini_sync(question: str,
                 try:
                     chat_api = getattr(_client, "chat", None)
                     if chat_api is not None and hasattr(chat_api, "completions") and hasattr(chat_api.completions, "create"):
-                        print("[ai_client] Using client.chat.completions.create(...)")
+                        logger.debug("Using client.chat.completions.create(...)")
                         resp = chat_api.completions.create(
                             model=model,
-                            messages=[
-                                {"role": "system", "content": "You are a concise helpful assistant."},
-                                {"role": "user", "content": question}
-                            ],
+                            messages=_messages(question),
                             temperature=temperature,
                             max_output_tokens=max_output_tokens
                         )
                         return _extract_text(resp)
 
-                    models_obj = getattr(_client, "models", None)
-                    if models_obj is None:
-                        raise RuntimeError("genai.Client has no .models attribute")
-
-       
-                    candidate_names = ["generate_content", "generate", "create", "call", "generate_text"]
-                    func = None
-                    func_name = None
-                    for n in candidate_names:
-                        if hasattr(models_obj, n):
-                            f = getattr(models_obj, n)
-                            if callable(f):
-                                func = f
-                                func_name = f"models.{n}"
-                                break
-
-                    if func is None:
-                        for n in ["generate_text", "generate"]:
-                            if hasattr(_client, n) and callable(getattr(_client, n)):
-                                func = getattr(_client, n)
-                                func_name = n
-                                break
-
+                    func, func_name = _GEN_FN, _GEN_FN_NAME
                     if func is None:
                         raise RuntimeError("No suitable generate function found on genai client.models or client")
 
-                    print(f"[ai_client] Using detected function: {func_name}")
-
-                    messages_variant = [{"role": "system", "content": "You are a concise helpful assistant."},
-                                         {"role": "user",   "content": question}]
-                    payload_variants = {
-                        "messages": {"messages": messages_variant, "model": model},
-                        "contents": {"contents": [question], "model": model},
-                        "input":    {"input": question, "model": model},
-                        "prompt":   {"prompt": question, "model": model},
-                    }
+                    logger.debug("Using detected function: %s", func_name)
 
+                    shape = _WINNING_SHAPE
+                    if shape is not None:
+                        try:
+                            resp = func(**_shape_kwargs(shape, question, model, max_output_tokens, temperature))
+                            return _extract_text(resp)
+                        except TypeError as te:
+                            logger.debug("Cached call shape %s rejected, probing again: %s", shape, te)
+                            _forget_winning_shape()
 
-                    token_param_names = ["max_output_tokens", "max_tokens", "max_tokens_to_sample"]
-                    temp_param_names = ["temperature", "temp"]
+                    payload_variants = _payload_variants(question, model)
 
-        
                     try:
-                        resp, trace = _call_with_signature(func, payload_variants)
-                        print("[ai_client] Call succeeded with trace:", trace)
+                        resp, trace, keys = _call_with_signature(func, payload_variants)
+                        logger.debug("Call succeeded with trace: %s", trace)
+                        _save_winning_shape(keys)
                         return _extract_text(resp)
                     except TypeError as te:
              
-                        print("[ai_client] base payload shapes failed, trying with token/temp variations:", te)
+                        logger.debug("Base payload shapes failed, trying with token/temp variations: %s", te)
                         augmented_variants = {}
                         for name, base in payload_variants.items():
-                            for tk in token_param_names + temp_param_names:
+                            for tk in _TOKEN_PARAM_NAMES + _TEMP_PARAM_NAMES:
                                 v = dict(base)
                             
-                                if tk in token_param_names:
+                                if tk in _TOKEN_PARAM_NAMES:
                                     v[tk] = max_output_tokens
                                 else:
                                     v[tk] = temperature
                                 augmented_variants[f"{name}+{tk}"] = v
                 
-                        resp, trace = _call_with_signature(func, augmented_variants)
-                        print("[ai_client] Augmented call succeeded with trace:", trace)
+                        resp, trace, keys = _call_with_signature(func, augmented_variants)
+                        logger.debug("Augmented call succeeded with trace: %s", trace)
+                        _save_winning_shape(keys)
                         return _extract_text(resp)
 
                 except Exception as e:
-                    print(f"[ai_client] New SDK attempt failed on try {attempt}: {e}")
+                    logger.debug("New SDK attempt failed on try %d: %s", attempt, e)
                     raise
 
 
             if _has_old_genai and _old_genai is not None:
                 try:
-                    print("[ai_client] Using older google.generativeai path")
+                    logger.debug("Using older google.generativeai path")
                     if hasattr(_old_genai, "ChatCompletion") and hasattr(_old_genai.ChatCompletion, "create"):
                         resp = _old_genai.ChatCompletion.create(
                             model=model,
-                            messages=[
-                                {"role": "system", "content": "You are a concise helpful assistant."},
-                                {"role": "user", "content": question}
-                            ],
+                            messages=_messages(question),
                             temperature=temperature,
                             max_output_tokens=max_output_tokens
                         )
@@ -239,7 +394,7 @@ def ask_gemini_sync(question: str,
                         return _extract_text(resp)
                     raise RuntimeError("No compatible function on older SDK")
                 except Exception as e:
-                    print(f"[ai_client] Older SDK attempt failed: {e}")
+                    logger.debug("Older SDK attempt failed: %s", e)
                     raise
 
             raise RuntimeError("No compatible Google GenAI SDK available")
@@ -248,10 +403,114 @@ def ask_gemini_sync(question: str,
             last_err = e
             if attempt < retries:
                 sleep = backoff * (2 ** attempt)
-                print(f"[ai_client] Attempt {attempt+1} failed: {e}; retrying after {sleep}s...")
+                logger.warning("Attempt %d failed: %s; retrying after %ss...", attempt + 1, e, sleep)
                 time.sleep(sleep)
                 continue
             else:
                 raise RuntimeError(f"Gemini/GenAI request failed after {retries+1} attempts: {e}") from e
 
     raise RuntimeError("Unreachable: ask_gemini_sync failed unexpectedly")
+
+async def ask_gemini(question: str,
+                     model: str = DEFAULT_MODEL,
+                     max_output_tokens: int = 512,
+                     temperature: float = 0.2,
+                     retries: int = 2,
+                     backoff: float = 1.0) -> str:
+    """
+    Awaitable ask via client.aio.models.generate_content, with no worker-thread hop.
+    SDKs without the async surface run ask_gemini_sync in a thread instead.
+    """
+    if not question or not question.strip():
+        return ""
+
+    cached = _cached_answer(model, question, temperature)
+    if cached is not None:
+        return cached
+
+    await _get_client_async()
+    generate = getattr(_AIO_MODELS, "generate_content", None)
+    if generate is None:
+        return await asyncio.to_thread(ask_gemini_sync, question, model, max_output_tokens,
+                                       temperature, retries, backoff)
+
+    for attempt in range(retries + 1):
+        try:
+            resp = await generate(
+                model=model,
+                contents=question,
+                config={"max_output_tokens": max_output_tokens, "temperature": temperature},
+            )
+            answer = _extract_text(resp)
+            _remember_answer(model, question, temperature, answer)
+            return answer
+        except Exception as e:
+            if attempt < retries:
+                sleep = backoff * (2 ** attempt)
+                logger.warning("Async attempt %d failed: %s; retrying after %ss...", attempt + 1, e, sleep)
+                await asyncio.sleep(sleep)
+                continue
+            raise RuntimeError(f"Gemini/GenAI request failed after {retries+1} attempts: {e}") from e
+
+    raise RuntimeError("Unreachable: ask_gemini failed unexpectedly")
+
+async def ask_gemini_stream(question: str,
+                            model: str = DEFAULT_MODEL,
+                            max_output_tokens: int = 512,
+                            temperature: float = 0.2,
+                            retries: int = 2,
+                            backoff: float = 1.0) -> AsyncIterator[str]:
+    """
+    Yield answer text as the model produces it (client.aio.models.generate_content_stream).
+    Opening the stream and reading the first chunk are retried like ask_gemini; once text
+    has been yielded, errors propagate. SDKs without async streaming fall back to one
+    chunk from ask_gemini_sync.
+    """
+    if not question or not question.strip():
+        return
+
+    cached = _cached_answer(model, question, temperature)
+    if cached is not None:
+        yield cached
+        return
+
+    await _get_client_async()
+    stream_fn = getattr(_AIO_MODELS, "generate_content_stream", None)
+    if stream_fn is None:
+        logger.debug("Streaming API unavailable -> single-chunk fallback")
+        yield await asyncio.to_thread(ask_gemini_sync, question, model, max_output_tokens,
+                                      temperature, retries, backoff)
+        return
+
+    for attempt in range(retries + 1):
+        try:
+            stream = await stream_fn(
+                model=model,
+                contents=question,
+                config={"max_output_tokens": max_output_tokens, "temperature": temperature},
+            )
+            first = ""
+            async for chunk in stream:
+                first = getattr(chunk, "text", None) or ""
+                if first:
+                    break
+            break
+        except Exception as e:
+            if attempt < retries:
+                sleep = backoff * (2 ** attempt)
+                logger.warning("Stream attempt %d failed: %s; retrying after %ss...", attempt + 1, e, sleep)
+                await asyncio.sleep(sleep)
+                continue
+            raise RuntimeError(f"Gemini/GenAI stream failed after {retries+1} attempts: {e}") from e
+
+    if not first:
+        return
+
+    parts = [first]
+    yield first
+    async for chunk in stream:
+        text = getattr(chunk, "text", None)
+        if text:
+            parts.append(text)
+            yield text
+    _remember_answer(model, question, temperature, "".join(parts).strip())
@@ -0,0 +1,34 @@
+# tests/test_db.py
+import asyncio
+import os
+
+import pytest
+
+asyncpg = pytest.importorskip("asyncpg")
+pytest.importorskip("sqlalchemy")
+pytest.importorskip("dotenv")
+
+from app import db
+
+DSN = os.getenv("QNA_TEST_DATABASE_URL")
+pytestmark = pytest.mark.skipif(not DSN, reason="QNA_TEST_DATABASE_URL not set")
+
+
+def test_writes_reuse_the_same_pooled_connection(monkeypatch):
+    async def run():
+        monkeypatch.setattr(db, "ASYNC_URL", DSN)
+        await db.init_db()
+        # max_size=1: every write goes through the same pooled connection.
+        pool = await asyncpg.create_pool(dsn=DSN, min_size=1, max_size=1)
+        monkeypatch.setattr(db, "pool", pool)
+        marker = f"pytest-pooled-{os.getpid()}"
+        try:
+            await db._write_batch([(marker, "first")])
+            await db._write_batch([(marker, "second"), (marker, "third")])
+            count = await pool.fetchval("SELECT count(*) FROM qa_history WHERE question = $1", marker)
+            await pool.execute("DELETE FROM qa_history WHERE question = $1", marker)
+        finally:
+            await pool.close()
+        return count
+
+    assert asyncio.run(run()) == 3
@@ -2,10 +2,9 @@
 
 
 import streamlit as st
-import requests
+import httpx
 from typing import List, Dict
 from datetime import datetime
-import pandas as pd
 import json
 import html
 
@@ -27,6 +26,46 @@ if "last_answer" not in st.session_state:
 if "q_input" not in st.session_state:
     st.session_state.q_input = ""
 
+def _http() -> httpx.Client:
+    """
+    One pooled httpx client per browser session (HTTP/2 when the backend offers it over TLS),
+    rebuilt only when the backend URL changes.
+    """
+    base = st.session_state.backend_url.rstrip("/")
+    client = st.session_state.get("http")
+    # Compare the raw URL, not client.base_url: httpx normalizes it (e.g. lowercases the host).
+    if client is None or st.session_state.get("http_base") != base:
+        if client is not None:
+            client.close()
+        client = httpx.Client(
+            http2=True,
+            timeout=40.0,
+            base_url=base,
+            limits=httpx.Limits(max_connections=8, max_keepalive_connections=4),
+        )
+        st.session_state.http = client
+        st.session_state.http_base = base
+    return client
+
+@st.cache_data(max_entries=32)
+def _render_history(rows: tuple) -> str:
+    """HTML for the history list, memoized on the (time, question, answer) rows."""
+    return "".join(
+        f"<div class='history-item'>"
+        f"<div class='small-muted'>{time}</div>"
+        f"<div><strong>Q:</strong> {html.escape(question)}</div>"
+        f"<div style='margin-top:6px;'><strong>A:</strong> {answer}</div>"
+        f"</div>"
+        for time, question, answer in rows
+    )
+
+@st.cache_data(max_entries=8)
+def _history_csv(rows: tuple) -> bytes:
+    """CSV export of the (question, answer, time) rows; pandas is only imported once there is history."""
+    import pandas as pd
+
+    return pd.DataFrame(rows, columns=["question", "answer", "time"]).to_csv(index=False).encode("utf-8")
+
 # -------------------- Custom CSS --------------------
 st.markdown(
     """
@@ -63,8 +102,8 @@ with st.sidebar.expander("⚙️ Settings & Backend", expanded=False):
     st.session_state.backend_url = st.text_input("Backend URL", value=st.session_state.backend_url)
     if st.button("Check backend"):
         try:
-            r = requests.get(f"{st.session_state.backend_url.rstrip('/')}/health", timeout=5)
-            if r.ok:
+            r = _http().get("/health", timeout=5)
+            if r.is_success:
                 st.success("Backend reachable ✓")
             else:
                 st.error(f"Backend responded: {r.status_code}")
@@ -118,24 +157,35 @@ if ask_button or ask_now:
     if not q:
         st.error("Please type a question.")
     else:
-        endpoint = f"{st.session_state.backend_url.rstrip('/')}/ask"
         try:
+            client = _http()
             with st.spinner("Thinking... contacting Gemini..."):
-                resp = requests.post(endpoint, json={"question": q}, timeout=40)
-            if resp.status_code == 200:
-                data = resp.json()
-                answer = data.get("answer", "").strip()
-                now = datetime.utcnow().isoformat() + "Z"
-                st.session_state.history.insert(0, {"question": q, "answer": answer, "time": now})
-                st.session_state.last_answer = answer
-                st.success("Answer received ✅")
-            else:
-                try:
-                    body = resp.json()
-                except Exception:
-                    body = resp.text
-                st.error(f"Backend error {resp.status_code}: {body}")
-        except requests.RequestException as e:
+                resp = client.send(client.build_request("POST", "/ask/stream", json={"question": q}), stream=True)
+            try:
+                if resp.status_code == 200:
+                    # Show tokens as they arrive; the full answer is rendered below once complete.
+                    live = st.empty()
+                    try:
+                        with live.container():
+                            streamed = st.write_stream(resp.iter_text())
+                    finally:
+                        # Also clears partial text when the stream breaks midway.
+                        live.empty()
+                    answer = (streamed if isinstance(streamed, str) else "".join(map(str, streamed))).strip()
+                    now = datetime.utcnow().isoformat() + "Z"
+                    st.session_state.history.insert(0, {"question": q, "answer": answer, "time": now})
+                    st.session_state.last_answer = answer
+                    st.success("Answer received ✅")
+                else:
+                    resp.read()
+                    try:
+                        body = resp.json()
+                    except Exception:
+                        body = resp.text
+                    st.error(f"Backend error {resp.status_code}: {body}")
+            finally:
+                resp.close()
+        except (httpx.HTTPError, httpx.InvalidURL) as e:
             st.error(f"Request failed: {e}")
 
 # -------------------- Latest answer --------------------
@@ -155,21 +205,16 @@ with cols[0]:
     if not st.session_state.history:
         st.info("No history yet — ask something above.")
     else:
-        for row in st.session_state.history[:50]:
-            st.markdown(f"<div class='history-item'>"
-                        f"<div class='small-muted'>{row['time']}</div>"
-                        f"<div><strong>Q:</strong> {html.escape(row['question'])}</div>"
-                        f"<div style='margin-top:6px;'><strong>A:</strong> {row['answer']}</div>"
-                        f"</div>", unsafe_allow_html=True)
+        rows = tuple((r["time"], r["question"], r["answer"]) for r in st.session_state.history[:50])
+        st.markdown(_render_history(rows), unsafe_allow_html=True)
 with cols[1]:
     if st.button("Clear history"):
         st.session_state.history = []
         st.session_state.last_answer = None
         st.success("History cleared")
     if st.session_state.history:
-        df = pd.DataFrame(st.session_state.history)
-        csv = df.to_csv(index=False)
-        st.download_button("Download CSV", data=csv, file_name="qna_history.csv", mime="text/csv")
+        rows = tuple((r["question"], r["answer"], r["time"]) for r in st.session_state.history)
+        st.download_button("Download CSV", data=_history_csv(rows), file_name="qna_history.csv", mime="text/csv")
 
 st.markdown("---")
 st.markdown("Made with ❤️ using Streamlit + Gemini + FastAPI")